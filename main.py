@@ -1,5 +1,6 @@
 import fire
 import asyncio
+import json
 import sys
 import os
 from loguru import logger
@@ -10,6 +11,11 @@ sys.path.append(os.getcwd())
 from src.platforms.site_8891 import Crawler8891
 from src.models.car import CarListing
 from src.database.supabase_client import SupabaseManager
+from src.database.local_store import ListingReplica
+from src.core.cleaning import car_identifier, reidentify_rows, ConfigChange
+
+# 上次重新識別時使用的品牌/車系配置快照
+IDENTIFIER_STATE_PATH = os.path.join("data", "identifier_state.json")
 
 class CarBotCLI:
     def crawl(self, source: str = '8891', pages: int = 1, headless: bool = True):
@@ -22,24 +28,95 @@ class CarBotCLI:
         if source == '8891':
             # 1. 爬蟲執行
             crawler = Crawler8891(headless=headless)
-            results: list[CarListing] = asyncio.run(crawler.run(max_pages=pages))
-            
-            logger.info(f"--- 共擷取 {len(results)} 筆資料 ---")
-            
-            if not results:
-                logger.warning("沒有擷取到任何資料，流程結束。")
-                return
+            results: list[CarListing] = self._run_crawler(crawler.run(max_pages=pages))
 
             # 2. 數據同步至 Supabase
-            logger.info("準備將資料同步至 Supabase...")
-            try:
-                supabase_manager = SupabaseManager()
-                supabase_manager.batch_upsert_cars(results)
-            except Exception as e:
-                logger.error(f"同步至 Supabase 時發生錯誤: {e}")
-                
+            self._upload(results)
+        else:
+            logger.warning(f"尚未支援: {source}")
+
+    def retry_failed(self, source: str = '8891', headless: bool = True):
+        """
+        只重新抓取失敗佇列 (data/failed_pages.json) 中的頁面
+        :param source: 來源平台 (預設 8891)
+        :param headless: 是否隱藏瀏覽器
+        """
+        if source == '8891':
+            crawler = Crawler8891(headless=headless)
+            results: list[CarListing] = self._run_crawler(crawler.retry_failed())
+            self._upload(results)
         else:
             logger.warning(f"尚未支援: {source}")
 
+    def _run_crawler(self, job) -> list[CarListing]:
+        # 爬蟲執行期間監看品牌/車系配置，修改後無需重啟即可生效
+        car_identifier.start_watching()
+        try:
+            return asyncio.run(job)
+        finally:
+            car_identifier.stop_watching()
+
+    def _upload(self, results: list[CarListing]):
+        logger.info(f"--- 共擷取 {len(results)} 筆資料 ---")
+
+        if not results:
+            logger.warning("沒有擷取到任何資料，流程結束。")
+            return
+
+        logger.info("準備將資料同步至 Supabase...")
+        try:
+            supabase_manager = SupabaseManager()
+            supabase_manager.batch_upsert_cars(results)
+        except Exception as e:
+            logger.error(f"同步至 Supabase 時發生錯誤: {e}")
+
+    def sync(self, full: bool = False, page_size: int = 5000, workers: int = 4,
+             db_path: str = os.path.join("data", "market_listings.db"), cursor_column: str = "updated_at",
+             overlap_seconds: int = 300):
+        """
+        將 Supabase 的 market_listings 同步至本地 SQLite 副本
+        :param full: 忽略上次的同步水位，重新抓取整個表格
+        :param page_size: 每次請求的筆數
+        :param workers: 首次同步時的平行請求數
+        :param db_path: 本地副本路徑
+        :param cursor_column: 增量同步使用的游標欄位，需在每次寫入時更新 (見 migrations/)
+        :param overlap_seconds: 增量同步時往回重讀的秒數，涵蓋尚未提交的並行寫入
+        """
+        supabase_manager = SupabaseManager()
+        replica = supabase_manager.sync_listings(ListingReplica(db_path, cursor_column), page_size=page_size,
+                                                 workers=workers, full=full, overlap_seconds=overlap_seconds)
+        replica.close()
+
+    def reidentify(self, full: bool = False, dry_run: bool = False):
+        """
+        依據品牌/車系配置的變動，增量重新識別資料庫中的品牌與車系
+        :param full: 忽略上次的配置快照，重新識別所有資料
+        :param dry_run: 只統計需要更新的筆數，不寫回資料庫
+        """
+        previous = None
+        if not full and os.path.exists(IDENTIFIER_STATE_PATH):
+            with open(IDENTIFIER_STATE_PATH, "r", encoding="utf-8") as f:
+                previous = json.load(f)
+
+        current = car_identifier.snapshot()
+        change = ConfigChange.between(previous, current) if previous is not None else None
+        if change is not None and not change:
+            logger.info("品牌/車系配置自上次重新識別後沒有變動，流程結束。")
+            return
+        logger.info(f"配置變動: {change if change is not None else '全部重新識別'}")
+
+        supabase_manager = SupabaseManager()
+        rows = supabase_manager.fetch_listings("external_id,original_title,processed_title,brand,series")
+        updates = reidentify_rows(rows, change)
+        logger.info(f"--- 共 {len(rows)} 筆資料，其中 {len(updates)} 筆品牌/車系有變動 ---")
+
+        if dry_run:
+            return
+
+        supabase_manager.update_identities(updates)
+        os.makedirs(os.path.dirname(IDENTIFIER_STATE_PATH), exist_ok=True)
+        with open(IDENTIFIER_STATE_PATH, "w", encoding="utf-8") as f:
+            json.dump(current, f, ensure_ascii=False, indent=2)
+
 if __name__ == '__main__':
     fire.Fire(CarBotCLI)
\ No newline at end of file
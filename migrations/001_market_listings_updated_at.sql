@@ -0,0 +1,25 @@
+-- market_listings.updated_at：本地副本增量同步 (main.py sync) 使用的游標欄位。
+-- 由觸發器在每次 INSERT / UPDATE 時以資料庫時間更新，
+-- 因此 batch_upsert_cars、update_identities 等寫入端不需要自行設定。
+-- 注意：時間戳在寫入時決定，但要到交易提交後才可見。並行交易可能讓較舊的時間戳
+-- 晚於較新的時間戳出現，因此增量同步每次都會往回重讀 overlap_seconds（預設 300 秒）。
+
+ALTER TABLE market_listings
+    ADD COLUMN IF NOT EXISTS updated_at timestamptz NOT NULL DEFAULT now();
+
+CREATE OR REPLACE FUNCTION market_listings_touch_updated_at()
+RETURNS trigger AS $$
+BEGIN
+    NEW.updated_at := clock_timestamp();
+    RETURN NEW;
+END;
+$$ LANGUAGE plpgsql;
+
+DROP TRIGGER IF EXISTS market_listings_touch_updated_at ON market_listings;
+CREATE TRIGGER market_listings_touch_updated_at
+    BEFORE INSERT OR UPDATE ON market_listings
+    FOR EACH ROW EXECUTE FUNCTION market_listings_touch_updated_at();
+
+-- (updated_at, external_id) 的 keyset 分頁索引
+CREATE INDEX IF NOT EXISTS market_listings_updated_at_external_id_idx
+    ON market_listings (updated_at, external_id);
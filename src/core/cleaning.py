@@ -1,8 +1,9 @@
 import re
 import json
 import os
+import threading
 import unicodedata
-from typing import Dict, Any, Tuple
+from typing import Dict, Any, List, Optional, Set, Tuple
 from loguru import logger
 
 # --- 核心清洗與數值轉換函數 ---
@@ -59,10 +60,110 @@ def refine_title(raw_title: str) -> str:
 
 # --- 品牌與車系識別 ---
 
+class _CompiledMatcher:
+    """
+    品牌/車系配置的不可變編譯結果。
+    重新加載時會建立新的實例並整體替換，識別過程中不會看到半更新的狀態。
+    """
+    def __init__(self, brand_map: Dict[str, str], series_lookup: Dict[str, Dict[str, List[str]]]):
+        self.brand_map = brand_map
+        self.series_lookup = series_lookup
+        self.brand_patterns = [(b_name, re.compile(b_regex, re.IGNORECASE)) for b_name, b_regex in brand_map.items()]
+        self.series_keywords = {
+            brand_key: [(s_name, kw.lower()) for s_name, keywords in series.items() for kw in keywords]
+            for brand_key, series in series_lookup.items()
+        }
+
+    def identify(self, title: str) -> Tuple[str, str]:
+        brand, series = "UNKNOWN", "其他"
+
+        # 1. 識別品牌
+        for b_name, pattern in self.brand_patterns:
+            if pattern.search(title):
+                brand = b_name
+                break
+
+        # 2. 如果找到品牌，則繼續識別車系（取最長的命中關鍵字）
+        keywords = self.series_keywords.get(brand.upper()) if brand != "UNKNOWN" else None
+        if keywords:
+            lowered = title.lower()
+            best_match_len = 0
+            for s_name, kw in keywords:
+                if kw in lowered and len(kw) > best_match_len:
+                    best_match_len = len(kw)
+                    series = s_name
+
+        return brand, series
+
+
+class ConfigChange:
+    """
+    兩份品牌/車系配置之間的差異，用於決定哪些資料需要重新識別。
+    @param brands: 品牌正則或車系文件有變動的品牌（大寫）。
+    @param keywords: 新增或移除的車系關鍵字（小寫）。
+    @param brand_patterns: 新增或修改過的品牌正則。
+    """
+    def __init__(self, brands: Set[str], keywords: Set[str], brand_patterns: List[str]):
+        self.brands = brands
+        self.keywords = keywords
+        self.brand_patterns = [re.compile(p, re.IGNORECASE) for p in brand_patterns]
+
+    def __bool__(self) -> bool:
+        return bool(self.brands or self.keywords or self.brand_patterns)
+
+    def __repr__(self) -> str:
+        return f"ConfigChange(brands={sorted(self.brands)}, keywords={len(self.keywords)})"
+
+    @classmethod
+    def between(cls, old: Dict[str, Any], new: Dict[str, Any]) -> "ConfigChange":
+        """
+        比較兩份配置快照 ({"brand_map": ..., "series": ...})。
+        """
+        old_brands, new_brands = old.get("brand_map", {}), new.get("brand_map", {})
+        old_series, new_series = old.get("series", {}), new.get("series", {})
+
+        # 品牌識別是先命中者優先，順序改變也視為變動
+        old_order = [b for b in old_brands if b in new_brands]
+        new_order = [b for b in new_brands if b in old_brands]
+        reordered = {b for b, before in zip(new_order, old_order) if b != before}
+
+        brands, keywords, brand_patterns = set(), set(), []
+        for b_name in set(old_brands) | set(new_brands):
+            if old_brands.get(b_name) != new_brands.get(b_name) or b_name in reordered:
+                brands.add(b_name.upper())
+                if b_name in new_brands:
+                    brand_patterns.append(new_brands[b_name])
+
+        for brand_key in set(old_series) | set(new_series):
+            before, after = old_series.get(brand_key, {}), new_series.get(brand_key, {})
+            if before == after:
+                continue
+            brands.add(brand_key)
+            before_kw = {(s, kw.lower()) for s, kws in before.items() for kw in kws}
+            after_kw = {(s, kw.lower()) for s, kws in after.items() for kw in kws}
+            keywords.update(kw for _, kw in before_kw ^ after_kw)
+
+        return cls(brands, keywords, brand_patterns)
+
+    def affects(self, brand: Optional[str], title: str) -> bool:
+        """
+        判斷一筆資料是否可能受此次配置變動影響。
+        @param brand: 資料目前儲存的品牌。
+        @param title: 清洗過的標題。
+        """
+        if brand and brand.upper() in self.brands:
+            return True
+        lowered = title.lower()
+        if any(kw in lowered for kw in self.keywords):
+            return True
+        return any(p.search(title) for p in self.brand_patterns)
+
+
 class CarIdentifier:
     """
     通過加載配置文件，從標題中識別車輛的品牌和車系。
     這是一個單例模式的實現，以避免重複加載配置。
+    配置文件修改後可透過 reload() 或 start_watching() 熱更新，無需重啟。
     """
     _instance = None
 
@@ -75,61 +176,151 @@ class CarIdentifier:
         # 防止重複初始化
         if hasattr(self, 'initialized'):
             return
-            
-        self.brand_map = self._load_json(os.path.join(config_dir, "brand_map.json"), "BRAND_MAP")
-        self.series_lookup = self._load_series_configs(os.path.join(config_dir, "series"))
+
+        self.config_dir = config_dir
+        self._reload_lock = threading.Lock()
+        self._watcher: Optional[threading.Thread] = None
+        self._stop_watching = threading.Event()
+        self._pending_removals: Set[str] = set()
+        self._mtimes = self._config_mtimes()
+        self._matcher = self._compile()
         self.initialized = True
         logger.info("品牌/車系識別器已初始化完成")
 
-    def _load_json(self, path: str, key: str) -> Dict:
+    @property
+    def brand_map(self) -> Dict[str, str]:
+        return self._matcher.brand_map
+
+    @property
+    def series_lookup(self) -> Dict[str, Dict[str, List[str]]]:
+        return self._matcher.series_lookup
+
+    def snapshot(self) -> Dict[str, Any]:
+        """
+        返回目前生效的配置內容，可序列化保存並於之後與新配置比較。
+        """
+        matcher = self._matcher
+        return {"brand_map": matcher.brand_map, "series": matcher.series_lookup}
+
+    def _compile(self, strict: bool = False) -> _CompiledMatcher:
+        brand_map = self._load_json(os.path.join(self.config_dir, "brand_map.json"), "BRAND_MAP", strict)
+        series_lookup = self._load_series_configs(os.path.join(self.config_dir, "series"), strict)
+        return _CompiledMatcher(brand_map, series_lookup)
+
+    def _config_mtimes(self) -> Dict[str, int]:
+        mtimes = {}
+        paths = [os.path.join(self.config_dir, "brand_map.json")]
+        series_dir = os.path.join(self.config_dir, "series")
+        if os.path.isdir(series_dir):
+            paths += [os.path.join(series_dir, f) for f in os.listdir(series_dir) if f.endswith(".json")]
+        for path in paths:
+            try:
+                mtimes[path] = os.stat(path).st_mtime_ns
+            except OSError:
+                continue
+        return mtimes
+
+    def _load_json(self, path: str, key: Optional[str], strict: bool = False) -> Dict:
         try:
             with open(path, "r", encoding="utf-8") as f:
-                return json.load(f).get(key, {})
-        except FileNotFoundError:
-            logger.warning(f"配置文件未找到: {path}")
-            return {}
+                data = json.load(f)
+                return data.get(key, {}) if key else data
         except Exception as e:
+            # 熱更新時文件可能正在寫入或暫時被改名（編輯器存檔、git checkout），
+            # 嚴格模式下拋出錯誤以保留舊配置
+            if strict:
+                raise
+            if isinstance(e, FileNotFoundError):
+                logger.warning(f"配置文件未找到: {path}")
+                return {}
             logger.error(f"加載 {path} 失敗: {e}")
             return {}
 
-    def _load_series_configs(self, series_dir: str) -> Dict:
+    def _load_series_configs(self, series_dir: str, strict: bool = False) -> Dict:
         series_lookup = {}
         if not os.path.isdir(series_dir):
+            if strict:
+                raise FileNotFoundError(f"車系配置目錄未找到: {series_dir}")
             logger.warning(f"車系配置目錄未找到: {series_dir}")
             return series_lookup
             
         for fname in os.listdir(series_dir):
             if fname.endswith(".json"):
                 brand_key = fname.replace(".json", "").upper()
-                series_lookup[brand_key] = self._load_json(os.path.join(series_dir, fname), None)
+                series_lookup[brand_key] = self._load_json(os.path.join(series_dir, fname), None, strict)
         return series_lookup
 
+    def reload(self, force: bool = False) -> Optional[ConfigChange]:
+        """
+        若配置文件有變動，重新編譯並原子地替換識別器。
+        編譯失敗（例如正則寫錯、brand_map.json 不存在）時保留舊的識別器。
+        車系文件被移除時，需在下一次檢查時仍不存在才會生效，避免存檔時的短暫改名造成誤判。
+        @param force: 即使文件修改時間未變也重新加載，並立即接受被移除的車系文件。
+        @return: 配置差異；若沒有任何變動則返回 None。
+        """
+        with self._reload_lock:
+            mtimes = self._config_mtimes()
+            removed = set(self._mtimes) - set(mtimes)
+            if not removed:
+                self._pending_removals = set()
+            if not force and mtimes == self._mtimes:
+                return None
+
+            if removed and not force and not removed <= self._pending_removals:
+                self._pending_removals = removed
+                logger.info(f"配置文件被移除，待下一次檢查確認: {sorted(removed)}")
+                return None
+
+            try:
+                matcher = self._compile(strict=True)
+            except (OSError, ValueError, re.error) as e:
+                logger.error(f"品牌/車系配置編譯失敗，保留舊配置: {e}")
+                return None
+
+            old = self.snapshot()
+            self._matcher = matcher
+            self._mtimes = mtimes
+            self._pending_removals = set()
+
+        change = ConfigChange.between(old, self.snapshot())
+        if change:
+            logger.info(f"品牌/車系配置已重新加載: {change}")
+        return change or None
+
+    def start_watching(self, interval: float = 2.0):
+        """
+        啟動背景執行緒，定期檢查配置目錄並在變動時自動重新加載。
+        @param interval: 檢查間隔（秒）。
+        """
+        if self._watcher and self._watcher.is_alive():
+            return
+        self._stop_watching.clear()
+
+        def _watch():
+            while not self._stop_watching.wait(interval):
+                try:
+                    self.reload()
+                except Exception as e:
+                    logger.error(f"監看配置目錄時發生錯誤: {e}")
+
+        self._watcher = threading.Thread(target=_watch, name="car-identifier-watcher", daemon=True)
+        self._watcher.start()
+        logger.info(f"開始監看配置目錄: {self.config_dir}")
+
+    def stop_watching(self):
+        """停止背景監看執行緒。"""
+        self._stop_watching.set()
+        if self._watcher:
+            self._watcher.join()
+            self._watcher = None
+
     def identify(self, title: str) -> Tuple[str, str]:
         """
         從給定的標題中識別品牌和車系。
         @param title: 清洗過的車輛標題。
         @return: 一個包含 (品牌, 車系) 的元組。
         """
-        # 預設值
-        brand, series = "UNKNOWN", "其他"
-
-        # 1. 識別品牌
-        for b_name, b_regex in self.brand_map.items():
-            if re.search(b_regex, title, re.IGNORECASE):
-                brand = b_name
-                break
-        
-        # 2. 如果找到品牌，則繼續識別車系
-        if brand != "UNKNOWN" and brand.upper() in self.series_lookup:
-            best_match_len = 0
-            for s_name, keywords in self.series_lookup[brand.upper()].items():
-                for kw in keywords:
-                    if kw.lower() in title.lower():
-                        if len(kw) > best_match_len:
-                            best_match_len = len(kw)
-                            series = s_name
-        
-        return brand, series
+        return self._matcher.identify(title)
 
 # --- 主協調函數 ---
 
@@ -164,4 +355,23 @@ def clean_car_data(raw_data: Dict[str, Any]) -> Dict[str, Any]:
         "series": series,
         "price": price,
         "mileage": mileage,
-    }
\ No newline at end of file
+    }
+
+def reidentify_rows(rows: List[Dict[str, Any]], change: Optional[ConfigChange] = None) -> List[Dict[str, Any]]:
+    """
+    以目前的識別器重新計算資料的品牌和車系，只返回結果真正改變的資料。
+
+    @param rows: 包含 'external_id', 'processed_title' 或 'original_title', 'brand', 'series' 的字典列表。
+    @param change: 配置差異；提供時只重新識別可能受影響的資料，為 None 時重新識別全部。
+    @return: 需要寫回的 {'external_id', 'brand', 'series'} 字典列表。
+    """
+    updates = []
+    for row in rows:
+        title = row.get("processed_title") or refine_title(row.get("original_title", ""))
+        if change is not None and not change.affects(row.get("brand"), title):
+            continue
+
+        brand, series = car_identifier.identify(title)
+        if (brand, series) != (row.get("brand"), row.get("series")):
+            updates.append({"external_id": row["external_id"], "brand": brand, "series": series})
+    return updates
@@ -0,0 +1,159 @@
+import os
+import sqlite3
+import threading
+from typing import Any, Dict, Iterable, List, Optional
+
+from src.models.car import CarListing
+
+class ListingReplica:
+    """
+    `market_listings` 的本地唯讀副本，存放於 SQLite。
+    由 SupabaseManager.sync_listings() 寫入，分析、估價等讀取端直接查詢本地文件，
+    不需要再分頁掃描整個 Supabase 表格。
+    """
+
+    TABLE_NAME = "market_listings"
+    STAGING_TABLE = "market_listings_staging"
+    # CarListing 的欄位加上同步游標欄位
+    COLUMNS = list(CarListing.model_fields.keys())
+    INDEXES = [("brand", "series"), ("year",), ("source",)]
+
+    def __init__(self, db_path: str = os.path.join("data", "market_listings.db"), cursor_column: str = "updated_at"):
+        self.db_path = db_path
+        self.cursor_column = cursor_column
+        self.columns = self.COLUMNS + ([cursor_column] if cursor_column not in self.COLUMNS else [])
+        self._lock = threading.Lock()
+
+        if os.path.dirname(db_path):
+            os.makedirs(os.path.dirname(db_path), exist_ok=True)
+        self.conn = sqlite3.connect(db_path, check_same_thread=False)
+        self.conn.row_factory = sqlite3.Row
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self._create_schema()
+
+    def _create_schema(self):
+        with self.conn:
+            self._create_table(self.TABLE_NAME)
+            self._create_indexes()
+            self.conn.execute("CREATE TABLE IF NOT EXISTS sync_state (key TEXT PRIMARY KEY, value TEXT)")
+
+    def _create_table(self, table: str):
+        column_defs = ", ".join(
+            f"{col} TEXT PRIMARY KEY" if col == "external_id" else col for col in self.columns
+        )
+        self.conn.execute(f"CREATE TABLE IF NOT EXISTS {table} ({column_defs})")
+
+    def _create_indexes(self):
+        for cols in self.INDEXES + [(self.cursor_column, "external_id")]:
+            name = f"idx_{self.TABLE_NAME}_{'_'.join(cols)}"
+            self.conn.execute(f"CREATE INDEX IF NOT EXISTS {name} ON {self.TABLE_NAME} ({', '.join(cols)})")
+
+    # --- 同步狀態 ---
+
+    def get_watermark(self) -> Optional[Dict[str, Any]]:
+        """
+        返回上次同步到的位置 {'cursor': 游標欄位值, 'external_id': 同值時的最後一筆}。
+        尚未同步過時返回 None。
+        """
+        rows = dict(self.conn.execute("SELECT key, value FROM sync_state").fetchall())
+        if "cursor" not in rows:
+            return None
+        return {"cursor": rows["cursor"], "external_id": rows.get("external_id", "")}
+
+    def set_watermark(self, cursor: Any, external_id: str):
+        if cursor is None:
+            raise ValueError(f"同步水位不可為 NULL，請確認 {self.cursor_column} 欄位已設為 NOT NULL")
+        with self._lock, self.conn:
+            self.conn.executemany(
+                "INSERT INTO sync_state (key, value) VALUES (?, ?) "
+                "ON CONFLICT(key) DO UPDATE SET value = excluded.value",
+                [("cursor", str(cursor)), ("external_id", external_id)],
+            )
+
+    # --- 寫入 ---
+
+    def upsert(self, rows: Iterable[Dict[str, Any]], staging: bool = False) -> int:
+        """
+        以 external_id 為鍵寫入或更新資料，未知欄位會被忽略。
+        @param staging: 寫入 begin_rebuild() 建立的暫存表，而非正式表格。
+        @return: 寫入的筆數。
+        """
+        table = self.STAGING_TABLE if staging else self.TABLE_NAME
+        placeholders = ", ".join("?" for _ in self.columns)
+        updates = ", ".join(f"{col} = excluded.{col}" for col in self.columns if col != "external_id")
+        sql = (f"INSERT INTO {table} ({', '.join(self.columns)}) VALUES ({placeholders}) "
+               f"ON CONFLICT(external_id) DO UPDATE SET {updates}")
+
+        values = [tuple(row.get(col) for col in self.columns) for row in rows]
+        if not values:
+            return 0
+        with self._lock, self.conn:
+            self.conn.executemany(sql, values)
+        return len(values)
+
+    # --- 完整重建 ---
+    # 重建期間資料寫入暫存表，正式表格維持舊資料供讀取；全部取得後才在單一交易中替換。
+
+    def begin_rebuild(self):
+        with self._lock, self.conn:
+            self.conn.execute(f"DROP TABLE IF EXISTS {self.STAGING_TABLE}")
+            self._create_table(self.STAGING_TABLE)
+
+    def commit_rebuild(self, cursor: Any, external_id: str = ""):
+        """
+        以暫存表替換正式表格並寫入新的水位。
+        @param cursor: 新的水位；為 None 時清除水位，下次同步仍為完整同步。
+        """
+        with self._lock:
+            self.conn.execute("BEGIN")
+            try:
+                self.conn.execute(f"DROP TABLE {self.TABLE_NAME}")
+                self.conn.execute(f"ALTER TABLE {self.STAGING_TABLE} RENAME TO {self.TABLE_NAME}")
+                self._create_indexes()
+                self.conn.execute("DELETE FROM sync_state")
+                if cursor is not None:
+                    self.conn.executemany(
+                        "INSERT INTO sync_state (key, value) VALUES (?, ?)",
+                        [("cursor", str(cursor)), ("external_id", external_id)],
+                    )
+                self.conn.commit()
+            except Exception:
+                self.conn.rollback()
+                raise
+
+    def abort_rebuild(self):
+        with self._lock, self.conn:
+            self.conn.execute(f"DROP TABLE IF EXISTS {self.STAGING_TABLE}")
+
+    # --- 讀取 ---
+
+    def count(self) -> int:
+        return self.conn.execute(f"SELECT COUNT(*) FROM {self.TABLE_NAME}").fetchone()[0]
+
+    def query(self, columns: str = "*", limit: Optional[int] = None, **filters: Any) -> List[Dict[str, Any]]:
+        """
+        從本地副本讀取資料。
+        @param columns: 要讀取的欄位，逗號分隔。
+        @param limit: 最多返回的筆數。
+        @param filters: 等值條件，例如 brand='TOYOTA', series='Camry'。
+        @return: 字典列表。
+        """
+        unknown = set(filters) - set(self.columns)
+        if unknown:
+            raise ValueError(f"未知的欄位: {', '.join(sorted(unknown))}")
+
+        sql = f"SELECT {columns} FROM {self.TABLE_NAME}"
+        if filters:
+            sql += " WHERE " + " AND ".join(f"{col} = ?" for col in filters)
+        sql += " ORDER BY external_id"
+        if limit is not None:
+            sql += f" LIMIT {int(limit)}"
+        return [dict(row) for row in self.conn.execute(sql, tuple(filters.values()))]
+
+    def to_dataframe(self, **filters: Any):
+        """以 pandas DataFrame 形式返回 query() 的結果。"""
+        import pandas as pd
+        return pd.DataFrame(self.query(**filters))
+
+    def close(self):
+        self.conn.close()
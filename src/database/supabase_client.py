@@ -1,20 +1,28 @@
 import os
 from supabase import create_client, Client
 from dotenv import load_dotenv
-from typing import List
+from collections import defaultdict
+from datetime import datetime, timedelta
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, Iterator, List, Optional
 from loguru import logger
 
 from src.models.car import CarListing
+from src.database.local_store import ListingReplica
 
 class SupabaseManager:
     """
     管理與 Supabase 資料庫之間所有互動的類。
     負責初始化客戶端以及執行數據操作（如 upsert）。
     """
-    def __init__(self):
+    def __init__(self, url: Optional[str] = None, key: Optional[str] = None):
+        """
+        @param url: Supabase（或相容 PostgREST 的服務）URL，預設讀取 SUPABASE_URL。
+        @param key: API KEY，預設讀取 SUPABASE_KEY。
+        """
         load_dotenv()
-        url: str = os.environ.get("SUPABASE_URL")
-        key: str = os.environ.get("SUPABASE_KEY")
+        url = url or os.environ.get("SUPABASE_URL")
+        key = key or os.environ.get("SUPABASE_KEY")
         if not url or not key:
             raise ValueError("需要在 .env 文件中設置 Supabase 的 URL 和 KEY")
         
@@ -29,6 +37,7 @@ class SupabaseManager:
         - 如果數據庫中已存在具有相同 `external_id` 的記錄，則更新該記錄。
         - 如果不存在，則插入一條新記錄。
         這可以有效避免數據重複，並時刻保持數據為最新狀態。
+        `updated_at` 由資料庫觸發器維護（見 migrations/），供本地副本增量同步使用。
 
         @param cars: 一個包含 CarListing Pydantic 模型的列表。
         @param table_name: 目標表格的名稱，預設為 'market_listings'。
@@ -63,3 +72,187 @@ class SupabaseManager:
             if hasattr(e, 'details'):
                 logger.error(f"錯誤詳情: {e.details}")
 
+    def fetch_listings(self, columns: str = "*", table_name: str = "market_listings",
+                       page_size: int = 1000) -> List[Dict[str, Any]]:
+        """
+        以分頁方式讀取表格中的所有資料。
+        以 external_id 做 keyset 分頁，直到取回空頁為止，不受伺服器 max-rows 上限影響。
+
+        @param columns: 要讀取的欄位，逗號分隔。
+        @param table_name: 來源表格的名稱，預設為 'market_listings'。
+        @param page_size: 每頁筆數。
+        @return: 字典列表。
+        """
+        rows: List[Dict[str, Any]] = []
+        for page in self._iter_by_id(table_name, columns, page_size):
+            rows.extend(page)
+        logger.info(f"從 '{table_name}' 讀取了 {len(rows)} 筆資料。")
+        return rows
+
+    def _iter_by_id(self, table_name: str, columns: str, page_size: int,
+                    lower: Optional[str] = None, upper: Optional[str] = None) -> Iterator[List[Dict[str, Any]]]:
+        """
+        依 external_id 遞增逐頁讀取 [lower, upper) 範圍內的資料。
+        @param lower: 起始 external_id（含），None 表示從頭開始。
+        @param upper: 結束 external_id（不含），None 表示讀到最後。
+        """
+        last = None
+        while True:
+            query = self.client.table(table_name).select(columns).order("external_id").limit(page_size)
+            if last is not None:
+                query = query.gt("external_id", last)
+            elif lower is not None:
+                query = query.gte("external_id", lower)
+            if upper is not None:
+                query = query.lt("external_id", upper)
+
+            page = query.execute().data or []
+            if not page:
+                return
+            yield page
+            last = page[-1]["external_id"]
+
+    def update_identities(self, updates: List[Dict[str, Any]], table_name: str = "market_listings",
+                          chunk_size: int = 200):
+        """
+        將重新識別後的品牌/車系寫回資料庫，只更新這兩個欄位。
+        相同 (brand, series) 的資料會合併成一次 `in` 條件的 update 請求。
+
+        @param updates: 包含 'external_id', 'brand', 'series' 的字典列表。
+        @param table_name: 目標表格的名稱，預設為 'market_listings'。
+        @param chunk_size: 單次請求最多包含的 external_id 數量。
+        """
+        if not updates:
+            logger.info("沒有需要更新的品牌/車系資料。")
+            return
+
+        groups: Dict[tuple, List[str]] = defaultdict(list)
+        for row in updates:
+            groups[(row["brand"], row["series"])].append(row["external_id"])
+
+        updated = 0
+        for (brand, series), ids in groups.items():
+            for i in range(0, len(ids), chunk_size):
+                chunk = ids[i:i + chunk_size]
+                self.client.table(table_name).update({"brand": brand, "series": series}) \
+                    .in_("external_id", chunk).execute()
+                updated += len(chunk)
+        logger.success(f"成功更新 {updated} 筆記錄的品牌/車系。")
+
+    def sync_listings(self, replica: Optional[ListingReplica] = None, table_name: str = "market_listings",
+                      page_size: int = 5000, workers: int = 4, full: bool = False,
+                      overlap_seconds: int = 300) -> ListingReplica:
+        """
+        將表格鏡像至本地 SQLite 副本。
+
+        - 首次同步（或 full=True）：先記下游標欄位目前的最大值作為水位，
+          再依 external_id 切成多個區間，以多個執行緒平行抓取。
+        - 之後的同步：只抓取游標欄位（預設 updated_at）大於上次水位的資料，
+          以 (游標欄位, external_id) 做 keyset 分頁。
+
+        游標欄位必須在每次寫入時更新，見 migrations/001_market_listings_updated_at.sql。
+        游標為 NULL 的資料只會在完整同步時取得。
+        游標值在寫入時決定、提交時才可見，並行的交易可能晚於較新的資料提交；
+        因此每次增量同步都從「水位 - overlap_seconds」開始重讀一段重疊區間（upsert 為冪等）。
+        注意：遠端刪除的資料不會反映到副本，需要時請以 full=True 重建。
+
+        @param replica: 目標本地副本，預設為 data/market_listings.db。
+        @param table_name: 來源表格的名稱，預設為 'market_listings'。
+        @param page_size: 每次請求的筆數。
+        @param workers: 首次同步時的平行請求數。
+        @param full: 忽略水位，重新抓取整個表格。
+        @param overlap_seconds: 增量同步時往回重讀的秒數，需大於最長的寫入交易時間。
+        @return: 同步完成的本地副本。
+        """
+        replica = replica or ListingReplica()
+        watermark = None if full else replica.get_watermark()
+
+        if watermark is None:
+            synced = self._pull_full(replica, table_name, page_size, workers)
+        else:
+            synced = self._pull_incremental(replica, table_name, page_size, watermark, overlap_seconds)
+
+        logger.success(f"同步完成：寫入 {synced} 筆，本地副本共 {replica.count()} 筆。")
+        return replica
+
+    def _max_cursor(self, table_name: str, cursor: str) -> Optional[Any]:
+        page = self.client.table(table_name).select(cursor).not_.is_(cursor, "null") \
+            .order(cursor, desc=True).limit(1).execute().data
+        return page[0][cursor] if page else None
+
+    def _partition_bounds(self, table_name: str, total: int, page_size: int) -> List[Optional[str]]:
+        """
+        以 offset 取得每 page_size 筆的 external_id 作為區間邊界。
+        external_id 不會因資料更新而改變排序位置，因此同步期間的寫入不會讓資料落在區間之外。
+        """
+        bounds: List[Optional[str]] = [None]
+        for offset in range(page_size, total, page_size):
+            page = self.client.table(table_name).select("external_id").order("external_id") \
+                .offset(offset).limit(1).execute().data
+            if not page:
+                break
+            bounds.append(page[0]["external_id"])
+        return bounds + [None]
+
+    def _pull_full(self, replica: ListingReplica, table_name: str, page_size: int, workers: int) -> int:
+        cursor = replica.cursor_column
+        # 先記下水位：同步期間被更新的資料游標必定更大，會由下一次增量同步補上
+        watermark = self._max_cursor(table_name, cursor)
+        total = self.client.table(table_name).select("external_id", count="exact").limit(1).execute().count or 0
+        bounds = self._partition_bounds(table_name, total, page_size)
+        logger.info(f"首次同步 '{table_name}'：共 {total} 筆，分為 {len(bounds) - 1} 個區間，{workers} 個平行請求。")
+
+        def fetch_partition(lower: Optional[str], upper: Optional[str]) -> List[Dict[str, Any]]:
+            return [row for page in self._iter_by_id(table_name, "*", page_size, lower, upper) for row in page]
+
+        # 寫入暫存表，全部區間取得後才替換，重建期間讀取端仍看到完整的舊資料
+        replica.begin_rebuild()
+        synced = 0
+        try:
+            with ThreadPoolExecutor(max_workers=workers) as executor:
+                for rows in executor.map(fetch_partition, bounds[:-1], bounds[1:]):
+                    synced += replica.upsert(rows, staging=True)
+                    logger.info(f"已同步 {synced}/{total} 筆...")
+        except Exception:
+            replica.abort_rebuild()
+            logger.error("完整同步中斷，本地副本保留原有資料。")
+            raise
+
+        if watermark is None:
+            logger.warning(f"'{table_name}' 沒有任何 {cursor} 不為 NULL 的資料，下次仍會完整同步。")
+        replica.commit_rebuild(watermark)
+        return synced
+
+    @staticmethod
+    def _rewind_cursor(value: str, seconds: int) -> str:
+        """將時間戳游標往回推 seconds 秒；非時間戳的游標（例如遞增 id）無法回推，原樣返回。"""
+        try:
+            moment = datetime.fromisoformat(value.replace("Z", "+00:00"))
+        except ValueError:
+            logger.warning(f"游標值 {value} 不是時間戳，無法重讀重疊區間，並行寫入的資料可能遺漏。")
+            return value
+        return (moment - timedelta(seconds=seconds)).isoformat()
+
+    def _pull_incremental(self, replica: ListingReplica, table_name: str, page_size: int,
+                          watermark: Dict[str, Any], overlap_seconds: int) -> int:
+        cursor = replica.cursor_column
+        last_value, last_id = self._rewind_cursor(watermark["cursor"], overlap_seconds), ""
+        logger.info(f"增量同步 '{table_name}'：從 {cursor} >= {last_value} 開始（水位 {watermark['cursor']}）。")
+
+        synced = 0
+        while True:
+            # keyset 分為兩段：先取完與水位同值的剩餘資料，再往下一個更大的值前進。
+            # postgrest-py 0.13 沒有 or_()，因此不使用 (a > x OR (a = x AND b > y)) 的寫法；
+            # NULL 不會符合任何比較條件，因此自然被排除。
+            page = self.client.table(table_name).select("*").eq(cursor, last_value) \
+                .gt("external_id", last_id).order("external_id").limit(page_size).execute().data
+            if not page:
+                page = self.client.table(table_name).select("*").gt(cursor, last_value) \
+                    .order(f"{cursor},external_id").limit(page_size).execute().data
+            if not page:
+                break
+
+            synced += replica.upsert(page)
+            last_value, last_id = page[-1][cursor], page[-1]["external_id"]
+            replica.set_watermark(last_value, last_id)
+        return synced
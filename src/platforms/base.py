@@ -1,28 +1,188 @@
+import asyncio
+import json
+import os
+import random
+import re
 from abc import ABC, abstractmethod
-from typing import List
+from datetime import datetime
+from typing import Dict, Iterable, List, Optional
 from src.models.car import CarListing
 from loguru import logger
 
+# --- 頁面錯誤分類 ---
+
+class PageError(Exception):
+    """
+    抓取單一頁面失敗時拋出，kind 用於決定重試策略。
+    重試用盡後 fetch_with_retry 會以此類包裝最後一次的例外，並記錄嘗試次數。
+    """
+    kind = "unknown"
+
+    def __init__(self, message: str = "", kind: Optional[str] = None, attempts: int = 1):
+        super().__init__(message)
+        if kind is not None:
+            self.kind = kind
+        self.attempts = attempts
+
+class PageTimeout(PageError):
+    """頁面載入逾時。"""
+    kind = "timeout"
+
+class SelectorMissing(PageError):
+    """頁面已載入，但找不到預期的元素（可能是版面改變或載入不完整）。"""
+    kind = "selector_missing"
+
+class PageBlocked(PageError):
+    """被網站阻擋（403/429、驗證頁等）。"""
+    kind = "blocked"
+
+
+# 只比對明確的狀態碼描述，避免網址或編號中的 403/429 被誤判
+BLOCKED_STATUS_RE = re.compile(r"\b(?:HTTP|status(?:\s*code)?)[\s:=]*(?:403|429)\b", re.IGNORECASE)
+BLOCKED_MARKERS = (
+    "captcha", "cf-challenge", "cf-chl", "access denied", "forbidden", "too many requests",
+    "人機驗證", "驗證碼", "請完成驗證", "存取被拒",
+)
+
+
+def is_blocked_content(text: str) -> bool:
+    """判斷頁面內容或錯誤訊息是否為驗證、阻擋頁面。"""
+    lowered = text.lower()
+    return any(marker in lowered for marker in BLOCKED_MARKERS)
+
+
+def classify_error(error: Exception) -> str:
+    """
+    將例外歸類為 timeout / selector_missing / blocked / unknown。
+    子類別應盡量拋出 PageError 的子類；其他例外則依類型名稱與訊息推斷。
+    """
+    if isinstance(error, PageError):
+        return error.kind
+    if isinstance(error, asyncio.TimeoutError) or type(error).__name__ == "TimeoutError":
+        return "timeout"
+    if BLOCKED_STATUS_RE.search(str(error)) or is_blocked_content(str(error)):
+        return "blocked"
+    return "unknown"
+
+
+# --- 失敗頁面佇列 ---
+
+class DeadLetterQueue:
+    """
+    持久化保存重試後仍失敗的頁面，供 `main.py retry-failed` 重新處理。
+    以 JSON 文件保存，鍵為 (來源, 頁碼)。
+    """
+
+    def __init__(self, path: str = os.path.join("data", "failed_pages.json")):
+        self.path = path
+        self.entries: Dict[str, Dict] = self._load()
+
+    def _load(self) -> Dict[str, Dict]:
+        try:
+            with open(self.path, "r", encoding="utf-8") as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return {}
+
+    def _save(self):
+        if os.path.dirname(self.path):
+            os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        # 先寫入暫存檔再替換，避免中斷時留下損壞的文件
+        tmp_path = f"{self.path}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(self.entries, f, ensure_ascii=False, indent=2)
+        os.replace(tmp_path, self.path)
+
+    @staticmethod
+    def _key(source: str, page: int) -> str:
+        return f"{source}:{page}"
+
+    def add(self, source: str, page: int, kind: str, error: str, attempts: int):
+        key = self._key(source, page)
+        previous = self.entries.get(key, {})
+        self.entries[key] = {
+            "source": source,
+            "page": page,
+            "kind": kind,
+            "error": error,
+            "attempts": previous.get("attempts", 0) + attempts,
+            "failed_at": datetime.now().isoformat(timespec="seconds"),
+        }
+        self._save()
+
+    def remove(self, source: str, page: int):
+        if self.entries.pop(self._key(source, page), None) is not None:
+            self._save()
+
+    def pages(self, source: str) -> List[int]:
+        """返回指定來源所有待重試的頁碼。"""
+        return sorted(e["page"] for e in self.entries.values() if e["source"] == source)
+
+
 class BaseCrawler(ABC):
-    def __init__(self, headless: bool = True):
+    # 每種錯誤的最大重試次數；blocked 的退避時間另外乘上 BLOCKED_BACKOFF_FACTOR
+    MAX_RETRIES = {"timeout": 3, "blocked": 2, "selector_missing": 1, "unknown": 2}
+    BACKOFF_BASE = 2.0
+    BLOCKED_BACKOFF_FACTOR = 5.0
+
+    def __init__(self, headless: bool = True, dead_letters: Optional[DeadLetterQueue] = None):
         self.headless = headless
+        self.dead_letters = dead_letters or DeadLetterQueue()
+        self.source = getattr(self, "SOURCE_NAME", self.__class__.__name__)
         # 設定 Log 格式，方便除錯
         self.logger = logger.bind(crawler=self.__class__.__name__)
 
+    is_blocked_content = staticmethod(is_blocked_content)
+
     @abstractmethod
     async def fetch_listings(self, page: int = 1) -> List[CarListing]:
         """子類別必須實作此方法"""
         pass
 
+    async def fetch_with_retry(self, page: int) -> List[CarListing]:
+        """
+        抓取單一頁面，失敗時依錯誤類型以指數退避重試。
+        重試次數用盡後拋出 PageError，包含錯誤類型與嘗試次數。
+        """
+        attempt = 0
+        while True:
+            try:
+                return await self.fetch_listings(page)
+            except Exception as e:
+                kind = classify_error(e)
+                if attempt >= self.MAX_RETRIES.get(kind, 0):
+                    raise PageError(str(e) or type(e).__name__, kind=kind, attempts=attempt + 1) from e
+                delay = self.BACKOFF_BASE * (2 ** attempt) * random.uniform(1, 1.5)
+                if kind == "blocked":
+                    delay *= self.BLOCKED_BACKOFF_FACTOR
+                attempt += 1
+                self.logger.warning(f"第 {page} 頁失敗 ({kind}): {e}，{delay:.1f} 秒後第 {attempt} 次重試")
+                await asyncio.sleep(delay)
+
+    async def run_pages(self, pages: Iterable[int]) -> List[CarListing]:
+        """
+        抓取指定頁碼。重試後仍失敗的頁面寫入失敗佇列，成功的頁面則從佇列移除。
+        """
+        all_cars = []
+        for p in pages:
+            try:
+                cars = await self.fetch_with_retry(p)
+            except PageError as e:
+                self.logger.error(f"第 {p} 頁失敗 ({e.kind})，已加入失敗佇列: {e}")
+                self.dead_letters.add(self.source, p, e.kind, str(e), e.attempts)
+                continue
+            all_cars.extend(cars)
+            self.dead_letters.remove(self.source, p)
+            self.logger.success(f"第 {p} 頁完成，成功解析 {len(cars)} 筆")
+        return all_cars
+
     async def run(self, max_pages: int = 1):
         """通用執行邏輯"""
         self.logger.info(f"啟動爬蟲，預計抓取 {max_pages} 頁")
-        all_cars = []
-        for p in range(1, max_pages + 1):
-            try:
-                cars = await self.fetch_listings(page=p)
-                all_cars.extend(cars)
-                self.logger.success(f"第 {p} 頁完成，成功解析 {len(cars)} 筆")
-            except Exception as e:
-                self.logger.error(f"第 {p} 頁失敗: {e}")
-        return all_cars
\ No newline at end of file
+        return await self.run_pages(range(1, max_pages + 1))
+
+    async def retry_failed(self):
+        """只重新抓取失敗佇列中屬於此來源的頁面。"""
+        pages = self.dead_letters.pages(self.source)
+        self.logger.info(f"失敗佇列中共有 {len(pages)} 頁待重試")
+        return await self.run_pages(pages)
@@ -2,8 +2,8 @@ import asyncio
 import re
 import random
 from typing import List, Dict, Any
-from playwright.async_api import async_playwright
-from src.platforms.base import BaseCrawler
+from playwright.async_api import async_playwright, TimeoutError as PlaywrightTimeoutError
+from src.platforms.base import BaseCrawler, PageBlocked, PageTimeout, SelectorMissing
 from src.models.car import CarListing
 from src.core.cleaning import clean_car_data # 導入新的主清洗函數
 
@@ -32,16 +32,31 @@ class Crawler8891(BaseCrawler):
 
             try:
                 self.logger.info(f"正在導航至 8891 第 {page_num} 頁: {target_url}")
-                await page.goto(target_url, wait_until="domcontentloaded", timeout=90000)
+                try:
+                    response = await page.goto(target_url, wait_until="domcontentloaded", timeout=90000)
+                except PlaywrightTimeoutError as e:
+                    raise PageTimeout(f"載入第 {page_num} 頁逾時") from e
+                if response and response.status in (403, 429):
+                    raise PageBlocked(f"第 {page_num} 頁被阻擋 (HTTP {response.status})")
                 await asyncio.sleep(random.uniform(2, 4)) # 模擬人類延遲
 
                 # 等待車輛列表的容器出現
                 list_container_selector = 'div[class*="main-list-container"]'
-                await page.wait_for_selector(list_container_selector, timeout=20000)
+                try:
+                    await page.wait_for_selector(list_container_selector, timeout=20000)
+                except PlaywrightTimeoutError as e:
+                    await self._raise_if_blocked(page, page_num)
+                    raise SelectorMissing(f"第 {page_num} 頁找不到列表容器 {list_container_selector}") from e
 
                 # 找到所有的車輛項目
                 item_selector = 'a[class*="_row-item"]'
                 items = await page.query_selector_all(item_selector)
+                if not items:
+                    # 空列表可能是以 HTTP 200 回應的驗證頁，不可視為成功；
+                    # 否則視為超過最後一頁的正常空頁，讓失敗佇列移除此頁
+                    await self._raise_if_blocked(page, page_num)
+                    self.logger.info(f"第 {page_num} 頁沒有車輛資料，可能已超過最後一頁。")
+                    return results
                 self.logger.info(f"在頁面 {page_num} 上找到 {len(items)} 筆車輛資料，開始解析...")
 
                 for item in items:
@@ -100,4 +115,16 @@ class Crawler8891(BaseCrawler):
                 await browser.close()
                 
         self.logger.info(f"完成頁面 {page_num} 的抓取，共獲得 {len(results)} 筆有效數據。")
-        return results
\ No newline at end of file
+        return results
+
+    async def _raise_if_blocked(self, page, page_num: int):
+        """
+        在找不到預期元素時檢查頁面內容，辨識以 HTTP 200 回應的驗證或阻擋頁。
+        只在元素缺失時檢查，避免正常頁面中的驗證相關腳本造成誤判。
+        """
+        try:
+            text = f"{await page.title()}\n{await page.content()}"
+        except Exception:
+            return
+        if self.is_blocked_content(text):
+            raise PageBlocked(f"第 {page_num} 頁為驗證或阻擋頁面")
\ No newline at end of file
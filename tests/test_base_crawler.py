@@ -0,0 +1,127 @@
+import asyncio
+import json
+
+import pytest
+
+from src.platforms import base
+from src.platforms.base import (
+    BaseCrawler, DeadLetterQueue, PageBlocked, PageError, PageTimeout, SelectorMissing, classify_error,
+)
+
+
+class FakeCrawler(BaseCrawler):
+    SOURCE_NAME = "fake"
+
+    def __init__(self, failures, **kwargs):
+        """
+        @param failures: {頁碼: [依序拋出的例外]}，用完後該頁成功返回。
+        """
+        super().__init__(**kwargs)
+        self.failures = failures
+        self.calls = {}
+
+    async def fetch_listings(self, page=1):
+        self.calls[page] = self.calls.get(page, 0) + 1
+        pending = self.failures.get(page, [])
+        if pending:
+            raise pending.pop(0)
+        return [f"car-{page}"]
+
+
+@pytest.fixture
+def sleeps(monkeypatch):
+    delays = []
+
+    async def fake_sleep(delay):
+        delays.append(delay)
+
+    monkeypatch.setattr(base.asyncio, "sleep", fake_sleep)
+    return delays
+
+
+@pytest.fixture
+def dlq(tmp_path):
+    return DeadLetterQueue(str(tmp_path / "failed_pages.json"))
+
+
+@pytest.mark.parametrize("error, kind", [
+    (PageTimeout(), "timeout"),
+    (SelectorMissing(), "selector_missing"),
+    (PageBlocked(), "blocked"),
+    (asyncio.TimeoutError(), "timeout"),
+    (Exception("HTTP 403 Forbidden"), "blocked"),
+    (Exception("status code: 429"), "blocked"),
+    (Exception("請完成人機驗證"), "blocked"),
+    (Exception("failed to parse https://auto.8891.com.tw/usedauto-infos-4290403.html"), "unknown"),
+    (ValueError("id 429 invalid"), "unknown"),
+])
+def test_classify_error(error, kind):
+    assert classify_error(error) == kind
+
+
+@pytest.mark.asyncio
+async def test_retry_counts_per_error_kind(sleeps, dlq):
+    crawler = FakeCrawler({
+        1: [PageTimeout()] * 2,  # 重試後成功
+        2: [PageTimeout()] * 5,  # timeout 最多重試 3 次
+        3: [SelectorMissing()] * 5,  # selector_missing 最多重試 1 次
+        4: [PageBlocked()] * 5,  # blocked 最多重試 2 次
+    }, dead_letters=dlq)
+
+    cars = await crawler.run(max_pages=5)
+
+    assert cars == ["car-1", "car-5"]
+    assert crawler.calls == {1: 3, 2: 4, 3: 2, 4: 3, 5: 1}
+    assert {e["page"]: (e["kind"], e["attempts"]) for e in dlq.entries.values()} == {
+        2: ("timeout", 4), 3: ("selector_missing", 2), 4: ("blocked", 3),
+    }
+
+
+@pytest.mark.asyncio
+async def test_backoff_is_exponential_and_longer_when_blocked(sleeps, dlq, monkeypatch):
+    monkeypatch.setattr(base.random, "uniform", lambda low, high: low)  # 去除隨機抖動
+    crawler = FakeCrawler({1: [PageTimeout()] * 3, 2: [PageBlocked()]}, dead_letters=dlq)
+    await crawler.run(max_pages=2)
+
+    assert sleeps == [2.0, 4.0, 8.0, 10.0]
+
+
+@pytest.mark.asyncio
+async def test_final_error_is_wrapped_with_kind_and_attempts(sleeps, dlq):
+    crawler = FakeCrawler({1: [RuntimeError("boom")] * 5}, dead_letters=dlq)
+
+    with pytest.raises(PageError) as info:
+        await crawler.fetch_with_retry(1)
+
+    assert (info.value.kind, info.value.attempts) == ("unknown", 3)
+    assert isinstance(info.value.__cause__, RuntimeError)
+
+
+@pytest.mark.asyncio
+async def test_retry_failed_only_reprocesses_dead_letters(sleeps, tmp_path):
+    path = str(tmp_path / "failed_pages.json")
+    crawler = FakeCrawler({2: [SelectorMissing("no items")] * 2}, dead_letters=DeadLetterQueue(path))
+    await crawler.run(max_pages=3)
+
+    with open(path, encoding="utf-8") as f:
+        assert list(json.load(f)) == ["fake:2"]
+
+    # 以新的佇列實例模擬重新啟動後執行 retry-failed
+    retry = FakeCrawler({}, dead_letters=DeadLetterQueue(path))
+    assert await retry.retry_failed() == ["car-2"]
+    assert retry.calls == {2: 1}
+    assert DeadLetterQueue(path).pages("fake") == []
+
+
+def test_dead_letter_queue_accumulates_attempts(dlq):
+    dlq.add("fake", 7, "timeout", "slow", attempts=4)
+    dlq.add("fake", 7, "blocked", "captcha", attempts=3)
+    dlq.add("other", 1, "unknown", "x", attempts=1)
+
+    reloaded = DeadLetterQueue(dlq.path)
+    assert reloaded.pages("fake") == [7]
+    assert reloaded.entries["fake:7"]["kind"] == "blocked"
+    assert reloaded.entries["fake:7"]["attempts"] == 7
+
+    reloaded.remove("fake", 7)
+    assert DeadLetterQueue(dlq.path).pages("fake") == []
@@ -0,0 +1,156 @@
+import json
+import os
+import time
+
+import pytest
+
+from conftest import STUB_KEY
+from src.core import cleaning
+from src.core.cleaning import CarIdentifier, ConfigChange, reidentify_rows
+from src.database.supabase_client import SupabaseManager
+
+
+def write_config(config_dir, brand_map, series):
+    os.makedirs(config_dir / "series", exist_ok=True)
+    (config_dir / "brand_map.json").write_text(json.dumps({"BRAND_MAP": brand_map}), encoding="utf-8")
+    for brand, data in series.items():
+        (config_dir / "series" / f"{brand.lower()}.json").write_text(json.dumps(data), encoding="utf-8")
+
+
+def touch_later(path):
+    # 確保修改時間一定改變，不受文件系統時間精度影響
+    stat = os.stat(path)
+    os.utime(path, ns=(stat.st_atime_ns, stat.st_mtime_ns + 1_000_000_000))
+
+
+@pytest.fixture
+def identifier(tmp_path, monkeypatch):
+    write_config(
+        tmp_path,
+        {"TOYOTA": "^TOYOTA", "BMW": "^BMW"},
+        {"TOYOTA": {"Camry": ["camry"], "Altis": ["altis"]}, "BMW": {"X5": ["x5"]}},
+    )
+    monkeypatch.setattr(CarIdentifier, "_instance", None)
+    ident = CarIdentifier(config_dir=str(tmp_path))
+    monkeypatch.setattr(cleaning, "car_identifier", ident)
+    return ident
+
+
+def test_identify_uses_longest_series_keyword(identifier):
+    assert identifier.identify("TOYOTA Camry 2.0") == ("TOYOTA", "Camry")
+    assert identifier.identify("BMW X5 xDrive") == ("BMW", "X5")
+    assert identifier.identify("Ford Focus") == ("UNKNOWN", "其他")
+
+
+def test_added_keyword_only_recomputes_that_brand(identifier, tmp_path):
+    rows = [
+        {"external_id": "1", "processed_title": "TOYOTA Corolla Cross", "brand": "TOYOTA", "series": "其他"},
+        {"external_id": "2", "processed_title": "TOYOTA Camry", "brand": "TOYOTA", "series": "Camry"},
+        # 儲存的值故意過時，但 BMW 配置未變動，不應被重新識別
+        {"external_id": "3", "processed_title": "BMW X5", "brand": "BMW", "series": "其他"},
+    ]
+    write_config(tmp_path, {"TOYOTA": "^TOYOTA", "BMW": "^BMW"},
+                 {"TOYOTA": {"Camry": ["camry"], "Altis": ["altis"], "Corolla Cross": ["cross"]}})
+    touch_later(tmp_path / "series" / "toyota.json")
+    change = identifier.reload()
+
+    assert change.brands == {"TOYOTA"}
+    assert change.keywords == {"cross"}
+    assert reidentify_rows(rows, change) == [{"external_id": "1", "brand": "TOYOTA", "series": "Corolla Cross"}]
+
+
+def test_reidentify_patches_only_changed_rows_grouped(identifier, tmp_path, postgrest_stub):
+    stub, url = postgrest_stub
+    stub.tables["market_listings"] = [
+        {"external_id": "1", "processed_title": "TOYOTA Corolla Cross", "brand": "TOYOTA", "series": "其他"},
+        {"external_id": "2", "processed_title": "TOYOTA Camry", "brand": "TOYOTA", "series": "Camry"},
+        {"external_id": "3", "processed_title": "TOYOTA Vios", "brand": "TOYOTA", "series": "其他"},
+        {"external_id": "4", "processed_title": "TOYOTA Cross 1.8", "brand": "TOYOTA", "series": "其他"},
+        {"external_id": "5", "processed_title": "BMW X5", "brand": "BMW", "series": "其他"},
+    ]
+    write_config(tmp_path, {"TOYOTA": "^TOYOTA", "BMW": "^BMW"}, {"TOYOTA": {
+        "Camry": ["camry"], "Altis": ["altis"], "Corolla Cross": ["cross"], "Vios": ["vios"],
+    }})
+    touch_later(tmp_path / "series" / "toyota.json")
+    change = identifier.reload()
+
+    manager = SupabaseManager(url=url, key=STUB_KEY)
+    rows = manager.fetch_listings("external_id,original_title,processed_title,brand,series")
+    manager.update_identities(reidentify_rows(rows, change))
+
+    patches = {(values["series"], dict(params)["external_id"]) for params, values in stub.patches}
+    assert patches == {("Corolla Cross", "in.(1,4)"), ("Vios", "in.(3)")}
+    assert [r["series"] for r in stub.tables["market_listings"]] == ["Corolla Cross", "Camry", "Vios", "Corolla Cross", "其他"]
+
+
+def test_changed_brand_regex_matches_new_titles(identifier):
+    old = identifier.snapshot()
+    new = {"brand_map": {"TOYOTA": "^(TOYOTA|豐田)", "BMW": "^BMW"}, "series": old["series"]}
+    change = ConfigChange.between(old, new)
+
+    assert change.brands == {"TOYOTA"}
+    assert change.affects("UNKNOWN", "豐田 Camry")
+    assert not change.affects("BMW", "BMW X5")
+
+
+def test_brand_map_reorder_is_a_change(identifier):
+    old = identifier.snapshot()
+    new = {"brand_map": {"BMW": "^BMW", "TOYOTA": "^TOYOTA"}, "series": old["series"]}
+
+    assert ConfigChange.between(old, new).brands == {"TOYOTA", "BMW"}
+    assert not ConfigChange.between(old, old)
+
+
+def test_unchanged_config_does_not_reload(identifier):
+    assert identifier.reload() is None
+
+
+@pytest.mark.parametrize("path, content", [
+    ("brand_map.json", "{bad json"),
+    ("brand_map.json", json.dumps({"BRAND_MAP": {"TOYOTA": "^(TOYOTA"}})),
+    ("series/toyota.json", "{bad json"),
+    ("brand_map.json", None),  # 編輯器存檔或 git checkout 時文件暫時不存在
+    ("series", None),
+])
+def test_invalid_config_keeps_old_matcher(identifier, tmp_path, path, content):
+    if content is None:
+        os.rename(tmp_path / path, tmp_path / f"{path}.bak")
+    else:
+        (tmp_path / path).write_text(content, encoding="utf-8")
+        touch_later(tmp_path / path)
+
+    for _ in range(2):
+        assert identifier.reload() is None
+    assert identifier.identify("TOYOTA Camry") == ("TOYOTA", "Camry")
+
+
+def test_removed_series_file_applies_on_next_poll(identifier, tmp_path):
+    series_file = tmp_path / "series" / "bmw.json"
+    os.rename(series_file, tmp_path / "bmw.json.bak")
+
+    # 第一次檢查只記錄，暫時改名後恢復不會產生任何變動
+    assert identifier.reload() is None
+    os.rename(tmp_path / "bmw.json.bak", series_file)
+    assert identifier.reload() is None
+    assert identifier.identify("BMW X5") == ("BMW", "X5")
+
+    os.remove(series_file)
+    assert identifier.reload() is None
+    change = identifier.reload()
+    assert change.brands == {"BMW"}
+    assert identifier.identify("BMW X5") == ("BMW", "其他")
+
+
+def test_watcher_picks_up_changes(identifier, tmp_path):
+    identifier.start_watching(interval=0.01)
+    try:
+        write_config(tmp_path, {"TOYOTA": "^TOYOTA", "BMW": "^BMW"}, {"BMW": {"X5": ["x5"], "X6": ["x6"]}})
+        touch_later(tmp_path / "series" / "bmw.json")
+        for _ in range(200):
+            if identifier.identify("BMW X6")[1] == "X6":
+                break
+            time.sleep(0.01)
+    finally:
+        identifier.stop_watching()
+
+    assert identifier.identify("BMW X6") == ("BMW", "X6")
@@ -0,0 +1,181 @@
+import sqlite3
+
+import pytest
+
+from conftest import STUB_KEY
+from src.database.local_store import ListingReplica
+from src.database.supabase_client import SupabaseManager
+
+
+def make_row(external_id, updated_at, brand="TOYOTA", series="Camry"):
+    return {
+        "source": "site_8891", "external_id": external_id, "link": f"https://example.com/{external_id}",
+        "year": 2020, "price": 50.0, "mileage": 3.0, "brand": brand, "series": series,
+        "updated_at": updated_at,
+    }
+
+
+@pytest.fixture
+def manager(postgrest_stub):
+    stub, url = postgrest_stub
+    return SupabaseManager(url=url, key=STUB_KEY)
+
+
+@pytest.fixture
+def replica(tmp_path):
+    replica = ListingReplica(str(tmp_path / "listings.db"))
+    yield replica
+    replica.close()
+
+
+def test_full_pull_with_max_rows_cap(postgrest_stub, manager, replica):
+    stub, _ = postgrest_stub
+    stub.max_rows = 3  # 小於 page_size，模擬伺服器端上限
+    stub.tables["market_listings"] = [make_row(f"{i:03d}", f"2024-01-0{1 + i % 5}T00:00:00+00:00") for i in range(23)]
+
+    manager.sync_listings(replica, page_size=5, workers=3)
+
+    assert replica.count() == 23
+    assert replica.get_watermark() == {"cursor": "2024-01-05T00:00:00+00:00", "external_id": ""}
+
+
+def test_full_pull_survives_concurrent_update(postgrest_stub, manager, replica):
+    stub, _ = postgrest_stub
+    rows = [make_row(f"{i:03d}", "2024-01-01T00:00:00+00:00") for i in range(6)]
+    stub.tables["market_listings"] = rows
+
+    def update_first_row(params):
+        # 第一個區間讀完後，另一個爬蟲更新了其中一筆
+        if ("external_id", "gt.001") in params:
+            rows[0].update(series="Altis", updated_at="2024-01-02T00:00:00+00:00")
+
+    stub.on_request = update_first_row
+    manager.sync_listings(replica, page_size=2, workers=1)
+    assert replica.count() == 6
+
+    stub.on_request = None
+    manager.sync_listings(replica, page_size=2)
+    assert replica.query(external_id="000")[0]["series"] == "Altis"
+
+
+def test_incremental_pull_across_equal_timestamps(postgrest_stub, manager, replica):
+    stub, _ = postgrest_stub
+    stub.max_rows = 2
+    rows = [make_row(f"{i:03d}", "2024-01-01T00:00:00+00:00") for i in range(5)]
+    stub.tables["market_listings"] = rows
+    manager.sync_listings(replica, page_size=2)
+
+    # 五筆新資料共用同一個時間戳，需要靠 external_id 跨頁銜接
+    tie = "2024-02-01T00:00:00+00:00"
+    rows += [make_row(f"1{i:02d}", tie) for i in range(5)]
+    rows[0].update(series="Altis", updated_at=tie)
+    synced_before = len(stub.requests)
+    manager.sync_listings(replica, page_size=2)
+
+    assert replica.count() == 10
+    assert replica.query(external_id="000")[0]["series"] == "Altis"
+    assert replica.get_watermark() == {"cursor": tie, "external_id": "104"}
+    # 增量同步的每個請求都以游標欄位過濾，不應再掃描整表
+    assert all("updated_at" in dict(params) for params in stub.requests[synced_before:])
+
+
+def test_incremental_pull_rereads_overlap_for_late_commits(postgrest_stub, manager, replica):
+    stub, _ = postgrest_stub
+    rows = [make_row("001", "2024-01-01T00:00:10+00:00")]
+    stub.tables["market_listings"] = rows
+    manager.sync_listings(replica)
+
+    # 交易 B 在 t=12 寫入並先提交，同步把水位推進到 12
+    rows.append(make_row("002", "2024-01-01T00:00:12+00:00"))
+    manager.sync_listings(replica, overlap_seconds=5)
+    assert replica.get_watermark()["cursor"] == "2024-01-01T00:00:12+00:00"
+
+    # 交易 A 在 t=11 寫入但較晚提交，游標已落後於水位
+    rows.append(make_row("003", "2024-01-01T00:00:11+00:00"))
+    manager.sync_listings(replica, overlap_seconds=5)
+
+    assert [r["external_id"] for r in replica.query("external_id")] == ["001", "002", "003"]
+    assert replica.get_watermark()["cursor"] == "2024-01-01T00:00:12+00:00"
+
+
+def test_incremental_pull_skips_null_cursor(postgrest_stub, manager, replica):
+    stub, _ = postgrest_stub
+    stub.tables["market_listings"] = [make_row("001", "2024-01-01T00:00:00+00:00"), make_row("002", None)]
+
+    manager.sync_listings(replica)
+    assert replica.count() == 2
+    assert replica.get_watermark()["cursor"] == "2024-01-01T00:00:00+00:00"
+
+    manager.sync_listings(replica)
+    assert replica.get_watermark()["cursor"] == "2024-01-01T00:00:00+00:00"
+
+    with pytest.raises(ValueError):
+        replica.set_watermark(None, "002")
+
+
+def test_full_rebuild_drops_deleted_rows(postgrest_stub, manager, replica):
+    stub, _ = postgrest_stub
+    stub.tables["market_listings"] = [make_row(f"{i:03d}", "2024-01-01T00:00:00+00:00") for i in range(4)]
+    manager.sync_listings(replica)
+
+    del stub.tables["market_listings"][1]
+    manager.sync_listings(replica)
+    assert replica.count() == 4
+
+    manager.sync_listings(replica, full=True)
+    assert [r["external_id"] for r in replica.query("external_id")] == ["000", "002", "003"]
+
+
+def test_failed_rebuild_keeps_old_replica(postgrest_stub, manager, replica):
+    stub, _ = postgrest_stub
+    rows = [make_row(f"{i:03d}", "2024-01-01T00:00:00+00:00") for i in range(6)]
+    stub.tables["market_listings"] = rows
+    manager.sync_listings(replica, page_size=2)
+    watermark = replica.get_watermark()
+
+    rows.append(make_row("006", "2024-01-02T00:00:00+00:00"))
+    seen_by_readers = []
+
+    def fail_last_partition(params):
+        # 讀取端在重建期間仍應看到完整的舊資料
+        with sqlite3.connect(replica.db_path) as reader:
+            seen_by_readers.append(reader.execute("SELECT COUNT(*) FROM market_listings").fetchone()[0])
+        if ("external_id", "gte.004") in params:
+            return 500
+
+    stub.on_request = fail_last_partition
+    with pytest.raises(Exception):
+        manager.sync_listings(replica, page_size=2, workers=1, full=True)
+
+    assert set(seen_by_readers) == {6}
+    assert replica.count() == 6
+    assert replica.get_watermark() == watermark
+
+    stub.on_request = None
+    manager.sync_listings(replica, page_size=2, full=True)
+    assert replica.count() == 7
+
+
+def test_fetch_listings_pages_past_max_rows(postgrest_stub, manager):
+    stub, _ = postgrest_stub
+    stub.max_rows = 4
+    stub.tables["market_listings"] = [make_row(f"{i:03d}", "2024-01-01T00:00:00+00:00") for i in range(10)]
+
+    rows = manager.fetch_listings("external_id,brand", page_size=4)
+
+    assert [r["external_id"] for r in rows] == [f"{i:03d}" for i in range(10)]
+
+
+def test_replica_query_filters(replica):
+    replica.upsert([
+        make_row("001", "2024-01-01", brand="TOYOTA", series="Camry"),
+        make_row("002", "2024-01-01", brand="TOYOTA", series="Altis"),
+        make_row("003", "2024-01-01", brand="BMW", series="X5"),
+    ])
+
+    assert [r["external_id"] for r in replica.query(brand="TOYOTA")] == ["001", "002"]
+    assert replica.query("external_id", brand="TOYOTA", series="Altis") == [{"external_id": "002"}]
+    assert len(replica.query(limit=2)) == 2
+
+    with pytest.raises(ValueError):
+        replica.query(colour="red")